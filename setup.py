@@ -2,12 +2,44 @@
 tikapy setup module.
 """
 
-from setuptools import setup, find_packages
+from setuptools import setup, find_packages, Extension
+from setuptools.command.build_ext import build_ext
 from codecs import open
 from os import path
 
 here = path.abspath(path.dirname(__file__))
 
+
+
+class optional_build_ext(build_ext):
+    """
+    Build extensions, but continue without them if building fails
+    (f.e. when no C compiler is available).
+    """
+
+    def run(self):
+        try:
+            super().run()
+        except Exception as exc:
+            self.warn('building optional extensions failed: %s' % exc)
+
+    def build_extension(self, ext):
+        try:
+            super().build_extension(ext)
+        except Exception as exc:
+            self.warn('building optional extension %s failed: %s'
+                      % (ext.name, exc))
+
+
+# Build the compiled word encoding helpers if Cython is available,
+# tikapy falls back to the pure python implementation otherwise.
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = cythonize([Extension('tikapy._fast', ['tikapy/_fast.pyx'])])
+
 setup(
     name='tikapy',
     version='0.2.1',
@@ -27,12 +59,18 @@ setup(
         'Topic :: Software Development :: Build Tools',
         'License :: OSI Approved :: BSD License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ],
+    python_requires='>=3.8',
 
     packages=[
         'tikapy',
         'tikapy.api',
-    ]
+    ],
+    ext_modules=ext_modules,
+    cmdclass={'build_ext': optional_build_ext},
 
 )
@@ -0,0 +1,84 @@
+from unittest import TestCase
+import asyncio
+from tikapy import ClientError
+from tikapy.aio import AsyncTikapyClient
+
+
+def encode(*sentence):
+    """
+    Encode a sentence of short words (< 128 chars) as sent by the API.
+    """
+    return b''.join(bytes(chr(len(w)) + w, 'latin-1')
+                    for w in sentence + ('',))
+
+
+class TestAsyncClient(TestCase):
+    """
+    Test the asyncio client against a fake API server.
+    """
+
+    REPLIES = {
+        '/login': encode('!done'),
+        '/ip/address/print': encode('!re', '=.id=*1', '=address=192.0.2.1')
+                             + encode('!done'),
+        # never answered
+        '/hang': b'',
+    }
+
+    async def _serve(self, reader, writer):
+        while True:
+            words = []
+            while True:
+                length = (await reader.read(1))
+                if not length:
+                    writer.close()
+                    return
+                word = (await reader.readexactly(ord(length))).decode()
+                if not word:
+                    break
+                words.append(word)
+            writer.write(self.REPLIES[words[0]])
+            await writer.drain()
+
+    async def _run(self):
+        server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            async with AsyncTikapyClient('127.0.0.1', port) as client:
+                await client.login('api-test', 'api123',
+                                   allow_insecure_auth_without_tls=True)
+                return await asyncio.gather(
+                    client.talk(['/ip/address/print']),
+                    client.talk(['/ip/address/print']))
+
+    def test_talk(self):
+        """
+        Login and run concurrent 'talk' calls on one client.
+        """
+        expected = {'1': {'.id': '*1', 'address': '192.0.2.1'}}
+        self.assertEqual(asyncio.run(self._run()), [expected, expected])
+
+    async def _run_hang(self):
+        server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            async with AsyncTikapyClient('127.0.0.1', port) as client:
+                await client.login('api-test', 'api123', timeOut=0.2,
+                                   allow_insecure_auth_without_tls=True)
+                with self.assertRaises(ClientError):
+                    await client.talk(['/hang'])
+                return client.connected
+
+    def test_talk_timeout(self):
+        """
+        A device not answering makes 'talk' fail after timeOut.
+        """
+        self.assertFalse(asyncio.run(self._run_hang()))
+
+    def test_sync_with(self):
+        """
+        Asyncio clients can not be used with a plain 'with' statement.
+        """
+        with self.assertRaises(TypeError):
+            with AsyncTikapyClient('127.0.0.1'):
+                pass
@@ -1,4 +1,5 @@
-from unittest import TestCase
+import io
+from unittest import TestCase, skipUnless
 from unittest.mock import Mock
 import tikapy
 
@@ -32,3 +33,129 @@ class TestWrites(TestCase):
                     b''.join(c[0][0] for c in sock.sendall.call_args_list),
                     bytes(out, 'latin-1'))
                 self.assertLessEqual(sock.sendall.call_count, 5)
+
+
+class TestReads(TestCase):
+    """
+    Test the read functions.
+    """
+
+    def test_read_word(self):
+        """
+        Words written by 'encode_word' are read back by 'read_word'.
+        """
+        for length in (0, 1, 127, 128, 0x3FFF, 0x4000, 0x10000, 0x10001,
+                       0x1FFFFF, 0x200000):
+            with self.subTest(size=length):
+                word = 'a' * length
+                data = io.BytesIO(
+                    bytes(tikapy.ApiRos.encode_word(word), 'latin-1'))
+                sock = Mock()
+                sock.recv_into.side_effect = data.readinto
+                api = tikapy.ApiRos(sock)
+                self.assertEqual(api.read_word(), word)
+
+    def test_read_word_buffered(self):
+        """
+        Words are read back through a buffered reader if one is set.
+        """
+        for length in (0, 1, 127, 128, 0x4000, 0x10001, 0x200000):
+            with self.subTest(size=length):
+                word = 'a' * length
+                data = io.BufferedReader(io.BytesIO(
+                    bytes(tikapy.ApiRos.encode_word(word), 'latin-1')))
+                sock = Mock()
+                api = tikapy.ApiRos(sock, rfile=data)
+                self.assertEqual(api.read_word(), word)
+                sock.recv_into.assert_not_called()
+
+
+@skipUnless(tikapy.api._fast, 'compiled helpers have not been built')
+class TestFastHelpers(TestCase):
+    """
+    Test the compiled helpers match the pure python implementation.
+    """
+
+    def test_encode_word(self):
+        """
+        Compare 'encode_word' for words across all length encodings.
+        """
+        encode_word = tikapy.api.PYTHON_HELPERS['encode_word'].__func__
+        for length in (0, 1, 0x7F, 0x80, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000):
+            with self.subTest(size=length):
+                word = 'a' * length
+                self.assertEqual(tikapy.api._fast.encode_word(word),
+                                 encode_word(word))
+
+    def test_decode_length(self):
+        """
+        Compare 'decode_length' for all control bytes.
+        """
+        decode_length = tikapy.api.PYTHON_HELPERS['decode_length'].__func__
+        for control in range(256):
+            with self.subTest(control=control):
+                try:
+                    expected = decode_length(control)
+                except tikapy.ApiUnrecoverableError:
+                    with self.assertRaises(tikapy.ApiUnrecoverableError):
+                        tikapy.api._fast.decode_length(control)
+                else:
+                    self.assertEqual(tikapy.api._fast.decode_length(control),
+                                     expected)
+
+    def test_parse_sentence(self):
+        """
+        Compare 'parse_sentence' for a typical reply.
+        """
+        parse_sentence = tikapy.api.PYTHON_HELPERS['parse_sentence'].__func__
+        sentence = ['!re', '=.id=*1', '=name=ether1', '=comment=a=b', '.tag=3']
+        self.assertEqual(tikapy.api._fast.parse_sentence(sentence),
+                         parse_sentence(sentence))
+
+
+class TestTalkMany(TestCase):
+    """
+    Test sending tagged commands.
+    """
+
+    @staticmethod
+    def encode(*sentence):
+        return bytes(''.join(chr(len(w)) + w for w in sentence + ('',)),
+                     'latin-1')
+
+    def test_talk_many(self):
+        """
+        Call 'talk_many' and check replies are demultiplexed by tag.
+        """
+        replies = io.BytesIO(
+            self.encode('!re', '=name=ether1', '.tag=1') +
+            self.encode('!done', '.tag=0') +
+            self.encode('!done', '.tag=1'))
+        sock = Mock()
+        sock.recv_into.side_effect = replies.readinto
+        api = tikapy.ApiRos(sock)
+        self.assertEqual(
+            api.talk_many([['/system/identity/print'],
+                           ['/interface/print']]),
+            [[('!done', {})],
+             [('!re', {'name': 'ether1'}), ('!done', {})]])
+        self.assertEqual(sock.sendall.call_count, 1)
+        self.assertEqual(
+            sock.sendall.call_args[0][0],
+            self.encode('/system/identity/print', '.tag=0') +
+            self.encode('/interface/print', '.tag=1'))
+
+    def test_trap(self):
+        """
+        A failing command raises an ApiError once all replies are read.
+        """
+        replies = io.BytesIO(
+            self.encode('!trap', '=message=failure', '.tag=0') +
+            self.encode('!done', '.tag=0') +
+            self.encode('!done', '.tag=1'))
+        sock = Mock()
+        sock.recv_into.side_effect = replies.readinto
+        api = tikapy.ApiRos(sock)
+        with self.assertRaises(tikapy.ApiError):
+            api.talk_many([['/invalid'], ['/interface/print']])
+        self.assertEqual(replies.read(), b'')
@@ -0,0 +1,380 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+import socket
+import socketserver
+import ssl
+import threading
+import tikapy
+
+
+class TestDnsCache(TestCase):
+    """
+    Test caching of address resolutions.
+    """
+
+    RESULT = [(socket.AF_INET, socket.SOCK_STREAM, 6, '',
+               ('192.0.2.1', 8728))]
+
+    def setUp(self):
+        tikapy.TikapyBaseClient.clear_dns_cache()
+
+    def tearDown(self):
+        tikapy.TikapyBaseClient.clear_dns_cache()
+
+    def test_resolve_once(self):
+        """
+        Creating multiple clients for the same host only resolves it once.
+        """
+        with patch('socket.getaddrinfo', return_value=self.RESULT) as gai:
+            tikapy.TikapyClient('router.example.com')
+            tikapy.TikapyClient('router.example.com')
+            self.assertEqual(gai.call_count, 1)
+
+    def test_expired(self):
+        """
+        Expired entries are resolved again.
+        """
+        with patch('socket.getaddrinfo', return_value=self.RESULT) as gai, \
+                patch('time.monotonic', side_effect=[0, 301]):
+            tikapy.TikapyClient('router.example.com')
+            tikapy.TikapyClient('router.example.com')
+            self.assertEqual(gai.call_count, 2)
+
+    def test_ssl_client(self):
+        """
+        SSL clients resolve the remote address ahead as well.
+        """
+        with patch('socket.getaddrinfo', return_value=self.RESULT) as gai:
+            tikapy.TikapySslClient('router.example.com')
+            tikapy.TikapyClient('router.example.com', 8729)
+            self.assertEqual(gai.call_count, 1)
+
+    def test_prune_expired(self):
+        """
+        Expired entries are dropped when adding new ones.
+        """
+        with patch('socket.getaddrinfo', return_value=self.RESULT), \
+                patch('time.monotonic', side_effect=[0, 301]):
+            tikapy.TikapyClient('router1.example.com')
+            tikapy.TikapyClient('router2.example.com')
+        self.assertEqual(list(tikapy._GAI_CACHE),
+                         [('router2.example.com', 8728)])
+
+    def test_size(self):
+        """
+        The oldest entries are dropped once the cache is full.
+        """
+        with patch('socket.getaddrinfo', return_value=self.RESULT), \
+                patch('tikapy._GAI_CACHE_SIZE', 2):
+            for i in range(3):
+                tikapy.TikapyClient('router%d.example.com' % i)
+        self.assertEqual(list(tikapy._GAI_CACHE),
+                         [('router1.example.com', 8728),
+                          ('router2.example.com', 8728)])
+
+
+class TestConnection(TestCase):
+    """
+    Test connection handling of the client.
+    """
+
+    def test_talk_without_login(self):
+        """
+        Calling 'talk' before 'login' raises a ClientError.
+        """
+        with patch('socket.getaddrinfo', side_effect=socket.gaierror):
+            client = tikapy.TikapyClient('router.example.com')
+        with self.assertRaises(tikapy.ClientError):
+            client.talk(['/ip/address/print'])
+
+
+class TestLogin(TestCase):
+    """
+    Test the choice of the login method.
+    """
+
+    def login(self, **kwargs):
+        """
+        Login a plain client connected to a socket looking like a SSL socket,
+        returns the words of the first sentence sent.
+        """
+        def connect_socket(client, timeOut):
+            client._base_sock = Mock(spec=ssl.SSLSocket)
+
+        with patch('socket.getaddrinfo', return_value=[]):
+            client = tikapy.TikapyClient('router.example.com')
+        with patch.object(tikapy.TikapyClient, '_connect_socket',
+                          connect_socket), \
+                patch.object(tikapy.ApiRos, 'talk',
+                             return_value=[('!done', {})]) as talk:
+            client.login('api-test', 'api123', **kwargs)
+        client.disconnect()
+        tikapy.TikapyBaseClient.clear_dns_cache()
+        return talk.call_args_list[0][0][0]
+
+    def test_challenge(self):
+        """
+        Plain clients never send the password, even if the socket has a
+        getpeercert attribute.
+        """
+        self.assertEqual(self.login(), ['/login'])
+
+    def test_allow_insecure(self):
+        """
+        The password is sent in plain text if explicitly allowed.
+        """
+        self.assertEqual(
+            self.login(allow_insecure_auth_without_tls=True),
+            ['/login', '=name=api-test', '=password=api123'])
+
+class TestSslContext(TestCase):
+    """
+    Test sharing of SSL contexts.
+    """
+
+    def test_context_reused(self):
+        """
+        Clients with the same settings share one SSLContext.
+        """
+        ctx = tikapy.TikapySslClient._get_ctx(False, True, True, False)
+        self.assertIs(
+            tikapy.TikapySslClient._get_ctx(False, True, True, False), ctx)
+
+    def test_no_verify(self):
+        """
+        Disabling certificate verification also disables address checks.
+        """
+        ctx = tikapy.TikapySslClient._get_ctx(False, False, True, False)
+        self.assertEqual(ctx.verify_mode, ssl.CERT_NONE)
+        self.assertFalse(ctx.check_hostname)
+        self.assertEqual(ctx.minimum_version, ssl.TLSVersion.TLSv1_2)
+
+
+class TestSslSession(TestCase):
+    """
+    Test resumption of TLS sessions.
+    """
+
+    def setUp(self):
+        tikapy._SSL_SESSIONS.clear()
+        with patch('socket.getaddrinfo', return_value=[]):
+            self.client = tikapy.TikapySslClient('router.example.com')
+
+    def tearDown(self):
+        tikapy._SSL_SESSIONS.clear()
+        tikapy.TikapyBaseClient.clear_dns_cache()
+
+    def connect(self, ctx):
+        """
+        Connect the client using ctx, returns the wrapped socket.
+        """
+        with patch.object(tikapy.TikapySslClient, '_get_ctx',
+                          return_value=ctx), \
+                patch.object(tikapy.TikapySslClient, '_connect_socket'):
+            self.client._connect(10)
+        return self.client._sock
+
+    @staticmethod
+    def context():
+        """
+        Returns a fake SSLContext wrapping sockets with a new session.
+        """
+        ctx = Mock()
+        ctx.wrap_socket.side_effect = lambda *args, **kwargs: Mock(
+            context=ctx, session=Mock())
+        return ctx
+
+    def test_store(self):
+        """
+        Sessions are stored after connecting and again on disconnect.
+        """
+        ctx = self.context()
+        sock = self.connect(ctx)
+        key = ('router.example.com', 8729)
+        self.assertEqual(tikapy._SSL_SESSIONS[key], (ctx, sock.session))
+        sock.session = Mock()
+        self.client.disconnect()
+        self.assertEqual(tikapy._SSL_SESSIONS[key], (ctx, sock.session))
+
+    def test_resume(self):
+        """
+        The stored session is passed on the next connection.
+        """
+        ctx = self.context()
+        sock = self.connect(ctx)
+        self.client.disconnect()
+        self.connect(ctx)
+        self.assertIsNone(ctx.wrap_socket.call_args_list[0][1]['session'])
+        self.assertIs(ctx.wrap_socket.call_args_list[1][1]['session'],
+                      sock.session)
+
+    def test_other_context(self):
+        """
+        Sessions are not resumed using a different SSLContext.
+        """
+        self.connect(self.context())
+        self.client.disconnect()
+        ctx = self.context()
+        self.assertIsNone(self.client._cached_session(ctx))
+        self.connect(ctx)
+        self.assertIsNone(ctx.wrap_socket.call_args[1]['session'])
+
+class TestTikToJson(TestCase):
+    """
+    Test conversion of API replies.
+    """
+
+    def test_rows(self):
+        """
+        Rows are keyed by their ID, rows without ID are skipped.
+        """
+        self.assertEqual(
+            tikapy.TikapyBaseClient.tik_to_json([
+                ('!re', {'.id': '*1', 'name': 'ether1'}),
+                ('!re', {'name': 'ether2'}),
+                ('!done', {}),
+            ]),
+            {'1': {'.id': '*1', 'name': 'ether1'}})
+
+    def test_ret(self):
+        """
+        The 'ret' attribute of a single '!done' reply is returned.
+        """
+        self.assertEqual(
+            tikapy.TikapyBaseClient.tik_to_json([('!done', {'ret': '*A'})]),
+            '*A')
+
+    def test_invalid(self):
+        """
+        Malformed replies raise a ClientError.
+        """
+        with self.assertRaises(tikapy.ClientError):
+            tikapy.TikapyBaseClient.tik_to_json([('!re',)])
+
+
+class TestPort(TestCase):
+    """
+    Test port validation.
+    """
+
+    def test_invalid(self):
+        """
+        Invalid port numbers raise a ValueError.
+        """
+        for port in (0, 65536, '8728', None):
+            with self.subTest(port=port):
+                with self.assertRaises(ValueError):
+                    tikapy.TikapySslClient('router.example.com', port)
+
+
+class FakeApiHandler(socketserver.BaseRequestHandler):
+    """
+    Answers a few fixed sentences of short words.
+    """
+
+    REPLIES = {
+        '/login': [['!done']],
+        '/ip/address/print': [['!re', '=.id=*1', '=address=192.0.2.1'],
+                              ['!done']],
+        '/system/identity/print': [['!re', '=name=MikroTik'], ['!done']],
+        '/hang': [],
+    }
+
+    def handle(self):
+        rfile = self.request.makefile('rb')
+        while True:
+            words = []
+            while True:
+                length = rfile.read(1)
+                if not length:
+                    return
+                word = rfile.read(ord(length)).decode()
+                if not word:
+                    break
+                words.append(word)
+            for sentence in self.REPLIES[words[0]]:
+                self.request.sendall(bytes(
+                    ''.join(chr(len(w)) + w for w in sentence + ['']),
+                    'latin-1'))
+
+
+class TestTalk(TestCase):
+    """
+    Test the client against a fake API server.
+    """
+
+    def test_talk(self):
+        """
+        Login and run multiple 'talk' calls on one connection.
+        """
+        server = socketserver.TCPServer(('127.0.0.1', 0), FakeApiHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            port = server.server_address[1]
+            with tikapy.TikapyClient('127.0.0.1', port) as client:
+                client.login('api-test', 'api123',
+                             allow_insecure_auth_without_tls=True)
+                for _ in range(2):
+                    self.assertEqual(
+                        client.talk(['/ip/address/print']),
+                        {'1': {'.id': '*1', 'address': '192.0.2.1'}})
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_read_timeout(self):
+        """
+        A read timeout disconnects the client.
+        """
+        server = socketserver.TCPServer(('127.0.0.1', 0), FakeApiHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            port = server.server_address[1]
+            with tikapy.TikapyClient('127.0.0.1', port) as client:
+                client.login('api-test', 'api123', timeOut=0.2,
+                             allow_insecure_auth_without_tls=True)
+                with self.assertRaises(tikapy.ClientError):
+                    client.talk(['/hang'])
+                self.assertFalse(client.connected)
+                with self.assertRaises(tikapy.ClientError):
+                    client.talk(['/ip/address/print'])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+class TestConnectSocket(TestCase):
+    """
+    Test connecting to resolved addresses.
+    """
+
+    ADDRESSES = [
+        (socket.AF_INET6, socket.SOCK_STREAM, 6, '',
+         ('fe80::1%eth0', 8728, 0, 2)),
+        (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.1', 8728)),
+    ]
+
+    def test_fallback(self):
+        """
+        Full socket addresses are used, only the last address gets the
+        remaining timeout.
+        """
+        with patch('tikapy._cached_getaddrinfo',
+                   return_value=self.ADDRESSES), \
+                patch('socket.socket') as sock_cls:
+            sock = sock_cls.return_value
+            sock.connect.side_effect = [OSError, None]
+            client = tikapy.TikapyClient('router.example.com')
+            client._connect_socket(10)
+            self.assertEqual(
+                [c[0][0] for c in sock.connect.call_args_list],
+                [self.ADDRESSES[0][4], self.ADDRESSES[1][4]])
+            timeouts = [c[0][0] for c in sock.settimeout.call_args_list]
+            self.assertEqual(timeouts[0],
+                             tikapy.TikapyBaseClient.CONNECT_ATTEMPT_TIMEOUT)
+            self.assertGreater(timeouts[1], 9)
+            client._base_sock = None
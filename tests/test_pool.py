@@ -0,0 +1,128 @@
+from unittest import TestCase
+import socketserver
+import threading
+import time
+import tikapy
+from tikapy.pool import TikapyPool
+from .test_client import FakeApiHandler
+
+
+class TestPool(TestCase):
+    """
+    Test connection reuse of the pool against a fake API server.
+    """
+
+    def setUp(self):
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0),
+                                                      FakeApiHandler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.port = self.server.server_address[1]
+        self.pool = TikapyPool(max_per_host=1)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def connection(self, user='api-test', password='api123', **kwargs):
+        return self.pool.connection('127.0.0.1', user, password,
+                                    port=self.port, **kwargs)
+
+    def acquire(self, user, **kwargs):
+        return self.pool.acquire('127.0.0.1', user, 'api123',
+                                 port=self.port, **kwargs)
+
+    def test_reuse(self):
+        """
+        Released clients are handed out again.
+        """
+        with self.connection() as client:
+            first = client
+        with self.connection() as client:
+            self.assertIs(client, first)
+            self.assertEqual(
+                client.talk(['/ip/address/print']),
+                {'1': {'.id': '*1', 'address': '192.0.2.1'}})
+
+    def test_drop_disconnected(self):
+        """
+        Clients disconnected while in use are not reused.
+        """
+        with self.connection() as client:
+            first = client
+            client.disconnect()
+        with self.connection() as client:
+            self.assertIsNot(client, first)
+
+    def test_max_per_host(self):
+        """
+        Acquiring more than max_per_host connections times out.
+        """
+        with self.connection():
+            with self.assertRaises(tikapy.ClientError):
+                with self.connection(timeout=0.01):
+                    pass
+
+    def test_invalid_port(self):
+        """
+        Failing to create a client frees its slot.
+        """
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.pool.acquire('127.0.0.1', 'api-test', 'api123',
+                                  port=70000, timeout=0.01)
+
+    def test_other_password(self):
+        """
+        Idle clients are not handed out for a different password.
+        """
+        with self.connection() as client:
+            first = client
+        with self.connection(password='wrong') as client:
+            self.assertIsNot(client, first)
+
+    def test_client_kwargs(self):
+        """
+        Client arguments are passed on, idle clients are only handed out for
+        the same arguments.
+        """
+        with self.connection(keepalive=False) as client:
+            first = client
+            self.assertFalse(client.keepalive)
+        with self.connection() as client:
+            self.assertIsNot(client, first)
+            self.assertTrue(client.keepalive)
+        with self.connection(keepalive=False) as client:
+            self.assertIs(client, first)
+
+    def test_release_wakes_waiter_of_key(self):
+        """
+        Releasing a client wakes the waiter of its key, even if waiters of
+        other keys are waiting as well.
+        """
+        bob = self.acquire('bob')
+        alice = self.acquire('alice')
+        results = {}
+
+        def wait_for(user):
+            start = time.monotonic()
+            results[user] = (self.acquire(user, timeout=5),
+                             time.monotonic() - start)
+
+        threads = [threading.Thread(target=wait_for, args=(user,))
+                   for user in ('bob', 'alice')]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.1)
+        self.pool.release(alice)
+        threads[1].join(5)
+        self.assertIs(results['alice'][0], alice)
+        self.assertLess(results['alice'][1], 1)
+        self.pool.release(bob)
+        threads[0].join(5)
+        self.assertIs(results['bob'][0], bob)
+        self.pool.release(results['alice'][0])
+        self.pool.release(results['bob'][0])
@@ -12,9 +12,14 @@
 MikroTik RouterOS Python API Clients
 """
 
+import atexit
+import functools
 import logging
 import socket
 import ssl
+import threading
+import time
+import weakref
 from .api import ApiError, ApiRos, ApiUnrecoverableError
 
 ## Imports for check to determine the OS
@@ -22,6 +27,86 @@ import os, sys
 
 LOG = logging.getLogger(__name__)
 
+_IS_WINDOWS = (os.name == "nt") and ("win" in sys.platform)
+
+## Cache for getaddrinfo() results, keyed by (host, port).
+## Values are tuples of (expiry, results), expiry based on time.monotonic().
+## Expired entries are dropped on insert, at most _GAI_CACHE_SIZE entries
+## are kept (oldest inserted entries are dropped first).
+_GAI_CACHE = {}
+_GAI_CACHE_SIZE = 256
+_GAI_LOCK = threading.Lock()
+
+## Cache for TLS sessions, keyed by (host, port).
+## Values are tuples of (SSLContext, SSLSession), sessions can only be
+## resumed using the context they were created with.
+_SSL_SESSIONS = {}
+_SSL_SESSIONS_LOCK = threading.Lock()
+
+## Serializes building SSL contexts, so concurrent first clients with the
+## same settings do not load the system CA store several times.
+_SSL_CTX_LOCK = threading.Lock()
+
+## Clients which have not been garbage collected yet, disconnected at exit.
+_CLIENTS = weakref.WeakSet()
+
+
+@atexit.register
+def _disconnect_all():
+    """
+    Disconnect all clients still alive when the interpreter exits.
+    """
+    for client in list(_CLIENTS):
+        client.disconnect()
+
+
+def _cached_getaddrinfo(host, port, ttl):
+    """
+    Resolve host/port for TCP connections, caching results for ttl seconds.
+    :param host: Hostname or address to resolve
+    :param port: Port to resolve
+    :param ttl: Number of seconds a cached result stays valid
+    :return: list of getaddrinfo() result tuples
+    :raises: socket.gaierror - if the address could not be resolved
+    """
+    key = (host, port)
+    now = time.monotonic()
+    with _GAI_LOCK:
+        entry = _GAI_CACHE.get(key)
+        if entry is not None and now < entry[0]:
+            return entry[1]
+    results = socket.getaddrinfo(host, port, socket.AF_UNSPEC,
+                                 socket.SOCK_STREAM)
+    if ttl > 0:
+        with _GAI_LOCK:
+            for expired in [k for k, (expiry, _) in _GAI_CACHE.items()
+                            if expiry <= now]:
+                del _GAI_CACHE[expired]
+            _GAI_CACHE.pop(key, None)
+            _GAI_CACHE[key] = (now + ttl, results)
+            while len(_GAI_CACHE) > _GAI_CACHE_SIZE:
+                del _GAI_CACHE[next(iter(_GAI_CACHE))]
+    return results
+
+
+def _interleave_families(addresses):
+    """
+    Reorder getaddrinfo() results alternating between address families,
+    starting with the family of the first result (see RFC 8305 section 4).
+    :param addresses: list of getaddrinfo() result tuples
+    :return: list of getaddrinfo() result tuples
+    """
+    by_family = {}
+    for addr in addresses:
+        by_family.setdefault(addr[0], []).append(addr)
+    ordered = []
+    while by_family:
+        for family in list(by_family):
+            ordered.append(by_family[family].pop(0))
+            if not by_family[family]:
+                del by_family[family]
+    return ordered
+
 
 class ClientError(Exception):
     """
@@ -35,6 +120,19 @@ class TikapyBaseClient():
     Base class for functions shared between the SSL and non-SSL API client
     """
 
+    __slots__ = ('_address', '_port', '_base_sock', '_sock', '_rfile', '_api',
+                 '_connected', '_is_tls', 'keepalive', '__weakref__')
+
+    ## Number of seconds resolved addresses are cached.
+    GAI_TTL = 300
+    ## TCP keepalive timings (in seconds) used for idle API sessions.
+    KEEPALIVE_IDLE = 60
+    KEEPALIVE_INTERVAL = 10
+    ## Seconds to wait for a connection before trying the next address.
+    CONNECT_ATTEMPT_TIMEOUT = 2
+    ## Size of the buffer used to read API replies.
+    READ_BUFFER_SIZE = 65536
+
     def __init__(self):
         """
         Constructor. Initialize instance variables.
@@ -43,7 +141,12 @@ class TikapyBaseClient():
         self._port = None
         self._base_sock = None
         self._sock = None
+        self._rfile = None
         self._api = None
+        self._connected = False
+        self._is_tls = False
+        self.keepalive = True
+        _CLIENTS.add(self)
 
     @property
     def address(self):
@@ -74,41 +177,79 @@ class TikapyBaseClient():
         Port of the remote API.
         :raises: ValueError - if invalid port number is specified
         """
-        try:
-            if not 0 < value < 65536:
-                raise ValueError('%d is not a valid port number' % value)
-            self._port = value
-        except ValueError as exc:
-            raise ValueError('invalid port number specified') from exc
+        if not isinstance(value, int) or not 0 < value < 65536:
+            raise ValueError('invalid port number: %r' % (value,))
+        self._port = value
+
+    @property
+    def connected(self):
+        """
+        Whether the client is logged in and its connection usable.
+        :return: bool
+        """
+        return self._connected
+
+    @classmethod
+    def clear_dns_cache(cls):
+        """
+        Remove all cached address resolutions.
+        """
+        with _GAI_LOCK:
+            _GAI_CACHE.clear()
 
-    def __del__(self):
+    def _prewarm_dns(self):
         """
-        Destructor. Tries to disconnect socket if it is still open.
+        Resolve the remote address ahead of the first connection attempt.
+        Resolution errors are ignored here, they are reported on connect.
         """
+        try:
+            _cached_getaddrinfo(self.address, self.port, self.GAI_TTL)
+        except (socket.error, UnicodeError):
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
         self.disconnect()
 
     def disconnect(self):
         """
         Disconnect/closes open sockets.
+        Calling this on an already disconnected client does nothing.
         """
+        self._connected = False
+        ## the socket is only closed once its file object is closed as well
+        try:
+            if self._rfile:
+                self._rfile.close()
+        except socket.error:
+            pass
+        self._rfile = None
         try:
             if self._sock:
                 self._sock.close()
         except socket.error:
             pass
+        self._sock = None
         try:
             if self._base_sock:
                 self._base_sock.close()
         except socket.error:
             pass
+        self._base_sock = None
 
     def _connect_socket(self, timeOut):
         """
         Connect the base socket.
         If self.address is a hostname, this function will loop through
         all available addresses until it can establish a connection.
+        Addresses of different families (IPv6/IPv4) are tried alternately.
+        Every address but the last one is given at most
+        CONNECT_ATTEMPT_TIMEOUT seconds, the last one gets what is left of
+        timeOut.
         :param timeOut: Time set for the timeout for the API connections
-        attempt.
+        attempt, used as total budget over all addresses.
         :raises: ClientError - if address/port has not been set
                              - if no connection to remote socket
                                could be established.
@@ -116,17 +257,30 @@ class TikapyBaseClient():
         if not self.address:
             raise ClientError('address has not been set')
         if not self.port:
-            raise ClientError('address has not been set')
+            raise ClientError('port has not been set')
 
-        for family, socktype, proto, _, sockaddr in \
-                socket.getaddrinfo(self.address,
-                                   self.port,
-                                   socket.AF_UNSPEC,
-                                   socket.SOCK_STREAM):
+        try:
+            addresses = _cached_getaddrinfo(self.address, self.port,
+                                            self.GAI_TTL)
+        except (socket.error, UnicodeError) as exc:
+            raise ClientError('could not open socket') from exc
+
+        self._base_sock = None
+        addresses = _interleave_families(addresses)
+        deadline = time.monotonic() + timeOut
+        for index, (family, socktype, proto, _, sockaddr) in \
+                enumerate(addresses):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ## all but the last address only get a short attempt, so an
+            ## unreachable address does not use up the whole timeOut
+            if index < len(addresses) - 1:
+                remaining = min(remaining, self.CONNECT_ATTEMPT_TIMEOUT)
 
             try:
                 self._base_sock = socket.socket(family, socktype, proto)
-                self._base_sock.settimeout(timeOut)
+                self._base_sock.settimeout(remaining)
             except socket.error:
                 self._base_sock = None
                 continue
@@ -137,6 +291,7 @@ class TikapyBaseClient():
                 self._base_sock.close()
                 self._base_sock = None
                 continue
+            self._base_sock.settimeout(timeOut)
             break
 
         if self._base_sock is None:
@@ -145,6 +300,35 @@ class TikapyBaseClient():
             # LOG.error('could not open socket')
             raise ClientError('could not open socket')
 
+        ## API words are small and written one after the other, disable
+        ## Nagle's algorithm so they are not delayed waiting for ACKs.
+        try:
+            self._base_sock.setsockopt(socket.IPPROTO_TCP,
+                                       socket.TCP_NODELAY, 1)
+        except socket.error:
+            pass
+
+        if self.keepalive:
+            self._enable_keepalive(self._base_sock)
+
+    def _enable_keepalive(self, sock):
+        """
+        Enable TCP keepalive on a socket, so idle API sessions
+        are not dropped by NAT devices or firewalls.
+        Keepalive timings are only set on platforms supporting them.
+        :param sock: Connected socket
+        """
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE,
+                                self.KEEPALIVE_IDLE)
+            if hasattr(socket, 'TCP_KEEPINTVL'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL,
+                                self.KEEPALIVE_INTERVAL)
+        except socket.error:
+            pass
+
     def _connect(self, timeOut):
         """
         Connects the socket and stores the result in self._sock.
@@ -155,10 +339,13 @@ class TikapyBaseClient():
         """
         self._connect_socket(timeOut)
         self._sock = self._base_sock
+        self._is_tls = False
 
     def login(self, user, password, timeOut=60, allow_insecure_auth_without_tls=False):
         """
         Connects to the API and tries to login the user.
+        The connection is kept open after login, call talk() as often
+        as needed and disconnect() once done.
         :param user: Username for API connections
         :param password: Password for API connections
         :param timeOut: Time set for the timeout for the API connections
@@ -168,13 +355,18 @@ class TikapyBaseClient():
         :raises: ClientError - if login failed
         """
         self._connect(timeOut)
-        self._api = ApiRos(self._sock)
+        self._rfile = self._sock.makefile('rb',
+                                          buffering=self.READ_BUFFER_SIZE)
+        self._api = ApiRos(self._sock, self._rfile)
         try:
-            socket_is_tls = hasattr(self._sock, "getpeercert")
-            send_plain_password = (socket_is_tls or allow_insecure_auth_without_tls)
+            send_plain_password = (self._is_tls or allow_insecure_auth_without_tls)
             self._api.login(user, password, send_plain_password)
         except (ApiError, ApiUnrecoverableError) as exc:
             raise ClientError('could not login') from exc
+        except OSError as exc:
+            self.disconnect()
+            raise ClientError('could not login') from exc
+        self._connected = True
 
     def talk(self, words):
         """
@@ -182,15 +374,64 @@ class TikapyBaseClient():
         :param words: List of command sequences to send to the API
         :returns: dict containing response or ID.
         :raises: ClientError - If client could not talk to remote API.
+                             - If client is not logged in.
                  ValueError - On invalid input.
         """
+        if not self._connected:
+            raise ClientError('not connected, login first')
         if isinstance(words, list) and all(isinstance(x, str) for x in words):
             try:
                 return self.tik_to_json(self._api.talk(words))
-            except (ApiError, ApiUnrecoverableError) as exc:
+            except ApiError as exc:
+                raise ClientError('could not talk to api') from exc
+            except ApiUnrecoverableError as exc:
+                self._connected = False
+                raise ClientError('could not talk to api') from exc
+            except OSError as exc:
+                # f.e. read timeouts leave the socket unusable
+                self.disconnect()
                 raise ClientError('could not talk to api') from exc
         raise ValueError('words needs to be a list of strings')
 
+    def talk_many(self, batch):
+        """
+        Send several command sequences to the API at once.
+        Commands are tagged and written in a single write, then all replies
+        are read. This takes one round-trip instead of one per command.
+        :param batch: List of command sequences to send to the API
+        :returns: dict mapping the index of each command sequence to its
+                  response or ID.
+        :raises: ClientError - If client could not talk to remote API.
+                             - If client is not logged in.
+                 ValueError - On invalid input.
+        """
+        if not self._connected:
+            raise ClientError('not connected, login first')
+        self._check_batch(batch)
+        try:
+            replies = self._api.talk_many(batch)
+        except ApiError as exc:
+            raise ClientError('could not talk to api') from exc
+        except ApiUnrecoverableError as exc:
+            self._connected = False
+            raise ClientError('could not talk to api') from exc
+        except OSError as exc:
+            # f.e. read timeouts leave the socket unusable
+            self.disconnect()
+            raise ClientError('could not talk to api') from exc
+        return {i: self.tik_to_json(r) for i, r in enumerate(replies)}
+
+    @staticmethod
+    def _check_batch(batch):
+        """
+        Validate input of talk_many().
+        :raises: ValueError - On invalid input.
+        """
+        if not (isinstance(batch, list) and batch and all(
+                isinstance(words, list) and words and
+                all(isinstance(x, str) for x in words) for words in batch)):
+            raise ValueError('batch needs to be a list of lists of strings')
+
     @staticmethod
     def tik_to_json(tikoutput):
         """
@@ -198,33 +439,42 @@ class TikapyBaseClient():
         :param tikoutput:
         :return: dict containing response or ID.
         """
-        try:
-            if tikoutput[0][0] == '!done':
-                return tikoutput[0][1]['ret']
-        except (IndexError, KeyError):
-            pass
-        try:
-            return {
-                d['.id'][1:]: d for d in ([x[1] for x in tikoutput])
-                if '.id' in d.keys()}
-        except (TypeError, IndexError) as exc:
-            raise ClientError('unable to convert api output to json') from exc
-       
+        if not tikoutput:
+            return {}
+        first = tikoutput[0]
+        if (len(first) > 1 and first[0] == '!done' and
+                isinstance(first[1], dict) and 'ret' in first[1]):
+            return first[1]['ret']
+        out = {}
+        for x in tikoutput:
+            if len(x) < 2 or not isinstance(x[1], dict):
+                raise ClientError('unable to convert api output to json')
+            d = x[1]
+            _id = d.get('.id')
+            if _id is not None:
+                out[_id[1:]] = d
+        return out
+
 
 class TikapyClient(TikapyBaseClient):
     """
     RouterOS API Client.
     """
 
-    def __init__(self, address, port=8728):
+    __slots__ = ()
+
+    def __init__(self, address, port=8728, keepalive=True):
         """
         Initialize client.
         :param address: Remote device address (maybe a hostname)
         :param port: Remote device port (defaults to 8728)
+        :param keepalive: Enable TCP keepalive on the connection
         """
         super().__init__()
         self.address = address
         self.port = port
+        self.keepalive = keepalive
+        self._prewarm_dns()
 
 
 class TikapySslClient(TikapyBaseClient):
@@ -232,49 +482,140 @@ class TikapySslClient(TikapyBaseClient):
     RouterOS SSL API Client.
     """
 
+    __slots__ = ('verify_cert', 'verify_addr', 'insecure_adh')
+
     def __init__(self, address, port=8729, verify_cert=True,
-                 verify_addr=True):
+                 verify_addr=True, keepalive=True, insecure_adh=False):
         """
         Initialize client.
         :param address: Remote device address (maybe a hostname)
         :param port: Remote device port (defaults to 8728)
         :param verify_cert: Verify device certificate against system CAs
         :param verify_addr: Verify provided address against certificate
+        :param keepalive: Enable TCP keepalive on the connection
+        :param insecure_adh: Use anonymous Diffie-Hellman ciphers, needed for
+                             RouterOS < 6.43 without a certificate.
+                             Disables certificate and address verification
+                             on non-Windows systems.
         """
         super().__init__()
         self.address = address
         self.port = port
+        self.keepalive = keepalive
         self.verify_cert = verify_cert
         self.verify_addr = verify_addr
+        self.insecure_adh = insecure_adh
+        self._prewarm_dns()
+
+    @classmethod
+    def _get_ctx(cls, is_windows, verify_cert, verify_addr, insecure_adh):
+        """
+        Returns the SSLContext used for the given settings.
+        Contexts are built by _build_ctx(), the lock keeps concurrent
+        first calls with the same settings from building them twice.
+        """
+        with _SSL_CTX_LOCK:
+            return cls._build_ctx(is_windows, verify_cert, verify_addr,
+                                  insecure_adh)
+
+    @classmethod
+    @functools.lru_cache(maxsize=8)
+    def _build_ctx(cls, is_windows, verify_cert, verify_addr, insecure_adh):
+        """
+        Builds the SSLContext used for the given settings.
+        Contexts are shared between all clients, so the system CA store is
+        only loaded once per set of settings. Keeping the contexts alive
+        also keeps their internal session cache, allowing to resume TLS
+        sessions.
+        Unless insecure_adh is set, the system default ciphers are used with
+        TLS 1.2 as minimum version. This allows TLS 1.3 with its 1-RTT
+        handshake and session ticket based resumption.
+        :param is_windows: Whether the running system is Windows
+        :param verify_cert: Verify device certificate against system CAs
+        :param verify_addr: Verify provided address against certificate
+        :param insecure_adh: Use anonymous Diffie-Hellman ciphers
+        :return: ssl.SSLContext
+        """
+        ctx = ssl.create_default_context()
+        if not insecure_adh:
+            ctx.minimum_version = ssl.TLSVersion.TLSv1_2
+            ctx.check_hostname = verify_cert and verify_addr
+            if not verify_cert:
+                ctx.verify_mode = ssl.CERT_NONE
+            return ctx
+
+        ## Added due to SSLv3 errors happening. This is even though ssl.create_default_context()
+        ## is suppose to set OP_NO_SSLv3, but it still tries to use SSLv3 and subsequently gets an
+        ## error. This was found on Windows and Linux environments. To bypass this you require to 
+        ## use ADH as the cipher with SECLEVEL set to 0.
+        if is_windows:
+            if not verify_cert:
+                ctx.verify_mode = ssl.CERT_OPTIONAL
+            if not verify_addr:
+                ctx.check_hostname = False
+
+            ctx.set_ciphers('ADH:@SECLEVEL=0')
+        else:
+            ctx.verify_mode = ssl.CERT_OPTIONAL
+            ctx.check_hostname = False
+            ctx.set_ciphers('ADH')
+        return ctx
+
+    def _cached_session(self, ctx):
+        """
+        Returns the TLS session of a previous connection to the same remote
+        API, or None if there is none usable with ctx.
+        :param ctx: SSLContext used for the new connection
+        """
+        with _SSL_SESSIONS_LOCK:
+            entry = _SSL_SESSIONS.get((self.address, self.port))
+        if entry is not None and entry[0] is ctx:
+            return entry[1]
+        return None
+
+    def _store_session(self):
+        """
+        Remember the TLS session of the current connection, so subsequent
+        connections to the same remote API can resume it.
+        """
+        session = getattr(self._sock, 'session', None)
+        if session is None:
+            return
+        with _SSL_SESSIONS_LOCK:
+            _SSL_SESSIONS[(self.address, self.port)] = (self._sock.context,
+                                                        session)
+
+    def disconnect(self):
+        """
+        Disconnect/closes open sockets.
+        The TLS session is stored before closing as TLS 1.3 session tickets
+        are only received after the handshake.
+        """
+        try:
+            self._store_session()
+        except (AttributeError, ValueError, socket.error):
+            pass
+        super().disconnect()
 
     def _connect(self, timeOut):
         """
         Connects a ssl socket.
+        A previously stored TLS session to the same remote API is resumed
+        if possible.
         :param timeOut: Time set for the timeout for the API connections
         attempt.
         """
         self._connect_socket(timeOut)
-        try:            
-            ## Added due to SSLv3 errors happening. This is even though ssl.create_default_context()
-            ## is suppose to set OP_NO_SSLv3, but it still tries to use SSLv3 and subsequently gets an
-            ## error. This was found on Windows and Linux environments. To bypass this you require to 
-            ## use ADH as the cipher with SECLEVEL set to 0.
-            if (os.name == "nt") and ("win" in sys.platform):
-                ctx = ssl.create_default_context()                            
-                if not self.verify_cert:
-                    ctx.verify_mode = ssl.CERT_OPTIONAL
-                if not self.verify_addr:
-                    ctx.check_hostname = False
-
-                ctx.set_ciphers('ADH:@SECLEVEL=0')
-            else:
-                ctx = ssl.create_default_context()
-                ctx.verify_mode = ssl.CERT_OPTIONAL
-                ctx.check_hostname = False
-                ctx.set_ciphers('ADH')
-            self._sock = ctx.wrap_socket(self._base_sock, server_hostname=self.address)
-        except ssl.SSLError:
+        try:
+            ctx = self._get_ctx(_IS_WINDOWS, self.verify_cert, self.verify_addr,
+                                self.insecure_adh)
+            self._sock = ctx.wrap_socket(self._base_sock,
+                                         server_hostname=self.address,
+                                         session=self._cached_session(ctx))
+        except ssl.SSLError as exc:
             ## Disable the log attempt as it creates unneeded forced info
             ## to shown on the screen with no option to disable this.
-            # LOG.error('could not establish SSL connection')
-            raise ClientError('could not establish SSL connection')
\ No newline at end of file
+            # LOG.error('could not establish SSL connection') from exc
+            raise ClientError('could not establish SSL connection') from exc
+        self._is_tls = True
+        self._store_session()
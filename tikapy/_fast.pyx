@@ -0,0 +1,95 @@
+#
+# Copyright (c) 2015, VSHN AG, info@vshn.ch
+# Licensed under "BSD 3-Clause". See LICENSE file.
+#
+# cython: language_level=3
+
+"""
+Compiled versions of the word encoding/decoding helpers of ApiRos.
+See tikapy.api.ApiRos for the reference implementation and documentation.
+"""
+
+from tikapy.api import ApiUnrecoverableError
+
+
+def encode_word(str word):
+    """
+    encodes a word including its length as sent over the wire.
+    """
+    cdef unsigned long long length = len(word)
+    cdef unsigned char buf[5]
+    cdef int n
+
+    # word length < 128
+    if length < 0x80:
+        buf[0] = <unsigned char>length
+        n = 1
+    # word length < 16384
+    elif length < 0x4000:
+        length |= 0x8000
+        buf[0] = (length >> 8) & 0xFF
+        buf[1] = length & 0xFF
+        n = 2
+    # word length < 2097152
+    elif length < 0x200000:
+        length |= 0xC00000
+        buf[0] = (length >> 16) & 0xFF
+        buf[1] = (length >> 8) & 0xFF
+        buf[2] = length & 0xFF
+        n = 3
+    # word length < 268435456
+    elif length < 0x10000000:
+        length |= 0xE0000000
+        buf[0] = (length >> 24) & 0xFF
+        buf[1] = (length >> 16) & 0xFF
+        buf[2] = (length >> 8) & 0xFF
+        buf[3] = length & 0xFF
+        n = 4
+    # word length < 549755813888
+    elif length < 0x8000000000:
+        buf[0] = 0xF0
+        buf[1] = (length >> 24) & 0xFF
+        buf[2] = (length >> 16) & 0xFF
+        buf[3] = (length >> 8) & 0xFF
+        buf[4] = length & 0xFF
+        n = 5
+    else:
+        raise ApiUnrecoverableError("word-length exceeded")
+    return (<char *>buf)[:n].decode('latin-1') + word
+
+
+def decode_length(unsigned int control):
+    """
+    decodes the first byte of an encoded word length.
+    """
+    if (control & 0x80) == 0x00:
+        return control, 0
+    elif (control & 0xC0) == 0x80:
+        return control & ~0xC0, 1
+    elif (control & 0xE0) == 0xC0:
+        return control & ~0xE0, 2
+    elif (control & 0xF0) == 0xE0:
+        return control & ~0xF0, 3
+    elif (control & 0xF8) == 0xF0:
+        return 0, 4
+    raise ApiUnrecoverableError("unknown control byte received")
+
+
+def parse_sentence(list sentence):
+    """
+    Split a reply sentence into its type and attributes.
+    """
+    cdef dict attrs = {}
+    cdef str word
+    cdef Py_ssize_t i, second_eq_pos
+
+    for i in range(1, len(sentence)):
+        word = sentence[i]
+        try:
+            second_eq_pos = word.index('=', 1)
+        except IndexError:
+            attrs[word[1:]] = ''
+        else:
+            attrs[word[1:second_eq_pos]] = word[second_eq_pos + 1:]
+
+    return sentence[0], attrs
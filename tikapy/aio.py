@@ -0,0 +1,466 @@
+#!/usr/bin/python3
+
+#
+# Copyright (c) 2015, VSHN AG, info@vshn.ch
+# Licensed under "BSD 3-Clause". See LICENSE file.
+#
+# Authors:
+#  - Andre Keller <andre.keller@vshn.ch>
+#
+
+"""
+MikroTik RouterOS Python API Clients based on asyncio
+
+Allows talking to many devices concurrently, f.e.:
+
+    async def query(address):
+        async with AsyncTikapySslClient(address) as client:
+            await client.login('api-test', 'api123')
+            return await client.talk(['/system/resource/print'])
+
+    results = await asyncio.gather(*[query(a) for a in addresses])
+
+Calls to talk() on the same client are serialized, as the API connection
+handles one command at a time.
+"""
+
+import asyncio
+from asyncio import staggered
+import functools
+import socket
+import ssl
+
+from . import (ClientError, TikapyBaseClient, TikapySslClient,
+               _IS_WINDOWS, _cached_getaddrinfo, _interleave_families)
+from .api import ApiError, ApiRos, ApiUnrecoverableError
+
+
+class AsyncApiRos(ApiRos):
+    """
+    MikroTik Router OS Python API using asyncio streams.
+    Words are encoded the same way as in ApiRos, but written to the stream
+    writer and only flushed once a sentence is complete.
+    """
+
+    def __init__(self, reader, writer):
+        """
+        Initialize base class.
+        Args:
+            reader - asyncio.StreamReader of an open connection
+            writer - asyncio.StreamWriter of an open connection
+        """
+        super().__init__(None)
+        self.reader = reader
+        self.writer = writer
+
+    async def login(self, username, password, send_plain_password=True):
+        """
+        Perform API login
+        Args:
+            username - Username used to login
+            password - Password used to login
+            send_plain_password - Whether to send plaintext password (new-style)
+                                  without requiring MD5 CRAM. Default True
+        """
+        if send_plain_password:
+            _, attrs = (await self.talk(["/login",
+                                         "=name=%s" % username,
+                                         "=password=%s" % password]))[0]
+        else:
+            _, attrs = (await self.talk(["/login"]))[0]
+
+            if "ret" in attrs:
+                response = self.challenge_response(password, attrs['ret'])
+
+                # send response & login request
+                await self.talk(["/login",
+                                 "=name=%s" % username,
+                                 "=response=%s" % response])
+
+    async def talk(self, words):
+        """
+        Communicate with the API
+        Args:
+            words - List of API words to send
+        """
+        if not words:
+            return
+
+        # Write sentence to API
+        await self.write_sentence(words)
+
+        replies = []
+
+        # Wait for reply
+        while True:
+            # read sentence
+            sentence = await self.read_sentence()
+
+            # empty sentences are ignored
+            if len(sentence) == 0:
+                continue
+
+            replies.append(self.parse_sentence(sentence))
+            if replies[-1][0] == '!done':
+                if replies[0][0] == '!trap':
+                    raise ApiError(replies[0][1])
+                if replies[0][0] == '!fatal':
+                    self.close()
+                    raise ApiUnrecoverableError(replies[0][1])
+                return replies
+
+    async def talk_many(self, batch):
+        """
+        Communicate with the API, sending several commands at once.
+        See ApiRos.talk_many.
+        Args:
+            batch - List of lists of API words to send
+        Returns:
+            list - replies for each command, in the order of batch
+        """
+        self.write_many(batch)
+        await self.drain()
+
+        replies = [[] for _ in batch]
+        pending = len(batch)
+        while pending:
+            sentence = await self.read_sentence()
+
+            # empty sentences are ignored
+            if len(sentence) == 0:
+                continue
+
+            if self.add_tagged_reply(replies, sentence):
+                pending -= 1
+        return self.check_tagged_replies(replies)
+
+    async def write_sentence(self, words):
+        """
+        writes a sentence word by word to API stream and flushes it.
+        Args:
+            words - List of API words to send
+        """
+        super().write_sentence(words)
+        await self.drain()
+
+    async def drain(self):
+        """
+        flush buffered data to the API stream.
+        """
+        try:
+            await self.writer.drain()
+        except OSError as exc:
+            raise ApiUnrecoverableError("could not send to socket") from exc
+
+    async def read_sentence(self):
+        """
+        reads sentence word by word from API stream.
+        Returns:
+            words - List of API words read from stream
+        """
+        words = []
+        while True:
+            word = await self.read_word()
+            if not word:
+                return words
+            words.append(word)
+
+    async def read_word(self):
+        """
+        read word from API stream
+        See ApiRos.read_word and
+        http://wiki.mikrotik.com/wiki/Manual:API#API_words for details.
+        """
+        length, extra = self.decode_length(ord(await self.read_sock(1)))
+
+        # read and shift the remaining bytes of the length, highest first
+        if extra:
+            for char in await self.read_sock(extra):
+                length = (length << 8) + ord(char)
+
+        return await self.read_sock(length)
+
+    def close(self):
+        """
+        close API stream, used after unrecoverable errors.
+        """
+        self.writer.close()
+
+    def write_sock(self, string):
+        """
+        write string to API stream buffer
+        Args:
+            string - String to send
+        """
+        self.writer.write(bytes(string, 'latin-1'))
+
+    async def read_sock(self, length):
+        """
+        read string with specified length from API stream
+        Args:
+            length - Number of chars to read from stream
+        Returns:
+            string - String as read from stream
+        """
+        try:
+            chunk = await self.reader.readexactly(length)
+        except (asyncio.IncompleteReadError, OSError) as exc:
+            raise ApiUnrecoverableError("could not read from socket") from exc
+        return chunk.decode('latin-1', 'replace')
+
+
+class AsyncTikapyBaseClient(TikapyBaseClient):
+    """
+    Base class for functions shared between the asyncio SSL and non-SSL
+    API client.
+    """
+
+    __slots__ = ('_reader', '_writer', '_lock', '_timeout')
+
+    ## Delay in seconds before trying the next address while connecting.
+    HAPPY_EYEBALLS_DELAY = 0.25
+
+    def __init__(self):
+        """
+        Constructor. Initialize instance variables.
+        """
+        super().__init__()
+        self._reader = None
+        self._writer = None
+        self._lock = None
+        self._timeout = None
+
+    def __enter__(self):
+        raise TypeError("use 'async with' with asyncio clients")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        writer = self._writer
+        self.disconnect()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def disconnect(self):
+        """
+        Disconnect/closes open streams.
+        """
+        self._connected = False
+        try:
+            if self._writer:
+                self._writer.close()
+        except (OSError, RuntimeError):
+            pass
+        self._writer = None
+        self._reader = None
+
+    def _ssl_context(self):
+        """
+        Returns the SSLContext to wrap the connection with, or None.
+        This is meant to be sub-classed by SSL clients.
+        """
+        return None
+
+    async def _connect(self, timeOut):
+        """
+        Connects to the remote API and stores the streams in self._reader
+        and self._writer.
+        Addresses are resolved using the same cache as the blocking clients
+        and tried in parallel, staggered by HAPPY_EYEBALLS_DELAY.
+        :param timeOut: Time set for the timeout for the API connections
+        attempt.
+        :raises: ClientError - if address/port has not been set
+                             - if no connection to remote socket
+                               could be established.
+        """
+        if not self.address:
+            raise ClientError('address has not been set')
+        if not self.port:
+            raise ClientError('port has not been set')
+
+        ctx = self._ssl_context()
+        loop = asyncio.get_running_loop()
+        try:
+            addresses = await loop.run_in_executor(
+                None, _cached_getaddrinfo, self.address, self.port,
+                self.GAI_TTL)
+        except (socket.error, UnicodeError) as exc:
+            raise ClientError('could not open socket') from exc
+
+        async def open_connection(family, socktype, proto, sockaddr):
+            sock = socket.socket(family, socktype, proto)
+            try:
+                sock.setblocking(False)
+                await asyncio.wait_for(loop.sock_connect(sock, sockaddr),
+                                       timeOut)
+                return await asyncio.wait_for(
+                    asyncio.open_connection(
+                        sock=sock, ssl=ctx,
+                        server_hostname=self.address if ctx else None),
+                    timeOut)
+            except BaseException:
+                sock.close()
+                raise
+
+        ## Happy eyeballs (RFC 8305): start a connection attempt to the next
+        ## address whenever the previous one did not succeed within
+        ## HAPPY_EYEBALLS_DELAY seconds, and use the first established one.
+        streams, _, errors = await staggered.staggered_race(
+            [functools.partial(open_connection, family, socktype, proto,
+                               sockaddr)
+             for family, socktype, proto, _, sockaddr
+             in _interleave_families(addresses)],
+            self.HAPPY_EYEBALLS_DELAY)
+        if streams is None:
+            if any(isinstance(exc, ssl.SSLError) for exc in errors):
+                raise ClientError('could not establish SSL connection')
+            raise ClientError('could not open socket')
+        self._reader, self._writer = streams
+        self._is_tls = ctx is not None
+
+        if self.keepalive:
+            self._enable_keepalive(self._writer.get_extra_info('socket'))
+        self._lock = asyncio.Lock()
+
+    async def login(self, user, password, timeOut=60,
+                    allow_insecure_auth_without_tls=False):
+        """
+        Connects to the API and tries to login the user.
+        :param user: Username for API connections
+        :param password: Password for API connections
+        :param timeOut: Time set for the timeout for the API connections
+        attempt. Default is 60 seconds.
+        :param allow_insecure_auth_without_tls: Boolean to allow insecure
+        authentication. Default is False.
+        :raises: ClientError - if login failed
+        """
+        await self._connect(timeOut)
+        self._timeout = timeOut
+        self._api = AsyncApiRos(self._reader, self._writer)
+        try:
+            send_plain_password = (self._is_tls or allow_insecure_auth_without_tls)
+            await asyncio.wait_for(
+                self._api.login(user, password, send_plain_password),
+                self._timeout)
+        except asyncio.TimeoutError as exc:
+            self.disconnect()
+            raise ClientError('could not login') from exc
+        except (ApiError, ApiUnrecoverableError) as exc:
+            raise ClientError('could not login') from exc
+        self._connected = True
+
+    async def _call_api(self, call):
+        """
+        Await an API call, limited to the timeOut given to login().
+        :param call: Awaitable talking to the API
+        :returns: result of call
+        :raises: ClientError - If client could not talk to remote API.
+        """
+        try:
+            return await asyncio.wait_for(call, self._timeout)
+        except asyncio.TimeoutError as exc:
+            ## the reply might still arrive later, the connection can not
+            ## be used anymore.
+            self.disconnect()
+            raise ClientError('could not talk to api') from exc
+        except ApiError as exc:
+            raise ClientError('could not talk to api') from exc
+        except ApiUnrecoverableError as exc:
+            self._connected = False
+            raise ClientError('could not talk to api') from exc
+
+    async def talk(self, words):
+        """
+        Send command sequence to the API.
+        Concurrent calls on the same client are sent one after another.
+        The reply has to arrive within the timeOut given to login().
+        :param words: List of command sequences to send to the API
+        :returns: dict containing response or ID.
+        :raises: ClientError - If client could not talk to remote API.
+                             - If client is not logged in.
+                 ValueError - On invalid input.
+        """
+        if not self._connected:
+            raise ClientError('not connected, login first')
+        if isinstance(words, list) and all(isinstance(x, str) for x in words):
+            async with self._lock:
+                return self.tik_to_json(
+                    await self._call_api(self._api.talk(words)))
+        raise ValueError('words needs to be a list of strings')
+
+    async def talk_many(self, batch):
+        """
+        Send several command sequences to the API at once.
+        See TikapyBaseClient.talk_many.
+        :param batch: List of command sequences to send to the API
+        :returns: dict mapping the index of each command sequence to its
+                  response or ID.
+        :raises: ClientError - If client could not talk to remote API.
+                             - If client is not logged in.
+                 ValueError - On invalid input.
+        """
+        if not self._connected:
+            raise ClientError('not connected, login first')
+        self._check_batch(batch)
+        async with self._lock:
+            replies = await self._call_api(self._api.talk_many(batch))
+        return {i: self.tik_to_json(r) for i, r in enumerate(replies)}
+
+
+class AsyncTikapyClient(AsyncTikapyBaseClient):
+    """
+    RouterOS API Client based on asyncio.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, address, port=8728, keepalive=True):
+        """
+        Initialize client.
+        :param address: Remote device address (maybe a hostname)
+        :param port: Remote device port (defaults to 8728)
+        :param keepalive: Enable TCP keepalive on the connection
+        """
+        super().__init__()
+        self.address = address
+        self.port = port
+        self.keepalive = keepalive
+
+
+class AsyncTikapySslClient(AsyncTikapyBaseClient):
+    """
+    RouterOS SSL API Client based on asyncio.
+    """
+
+    __slots__ = ('verify_cert', 'verify_addr', 'insecure_adh')
+
+    def __init__(self, address, port=8729, verify_cert=True,
+                 verify_addr=True, keepalive=True, insecure_adh=False):
+        """
+        Initialize client.
+        :param address: Remote device address (maybe a hostname)
+        :param port: Remote device port (defaults to 8729)
+        :param verify_cert: Verify device certificate against system CAs
+        :param verify_addr: Verify provided address against certificate
+        :param keepalive: Enable TCP keepalive on the connection
+        :param insecure_adh: Use anonymous Diffie-Hellman ciphers, see
+                             TikapySslClient.
+        """
+        super().__init__()
+        self.address = address
+        self.port = port
+        self.keepalive = keepalive
+        self.verify_cert = verify_cert
+        self.verify_addr = verify_addr
+        self.insecure_adh = insecure_adh
+
+    def _ssl_context(self):
+        """
+        Returns the SSLContext shared with TikapySslClient.
+        """
+        return TikapySslClient._get_ctx(_IS_WINDOWS, self.verify_cert,
+                                        self.verify_addr, self.insecure_adh)
@@ -43,14 +43,23 @@ class ApiRos:
     Within MikroTik API 'words' and 'sentences' have a very specific meaning
     """
 
-    def __init__(self, sock):
+    # size of the receive buffer in bytes
+    RX_BUFFER_SIZE = 65536
+
+    def __init__(self, sock, rfile=None):
         """
         Initialize base class.
         Args:
             sock - Socket (should already be opened and connected)
+            rfile - Optional buffered reader of sock, as returned by
+                    sock.makefile('rb'). Reading from it saves a recv()
+                    call for most of the short words sent by the API.
         """
         self.sock = sock
+        self.rfile = rfile
         self.currenttag = 0
+        # receive buffer, reused for every word read
+        self._rxview = None
 
     def login(self, username, password, send_plain_password=True):
         """
@@ -99,19 +108,31 @@ class ApiRos:
             _, attrs = self.talk(["/login"])[0]
 
             if "ret" in attrs:
-                # Prepare response for challenge-response login
-                # response is MD5 of 0-char + plaintext-password + challange
-                response = hashlib.md5()
-                response.update(b'\x00')
-                response.update(password.encode('UTF-8'))
-                response.update(binascii.unhexlify((attrs['ret']).encode('UTF-8')))
-                response = "00" + binascii.hexlify(response.digest()).decode('UTF-8')
+                response = self.challenge_response(password, attrs['ret'])
 
                 # send response & login request
                 self.talk(["/login",
                         "=name=%s" % username,
                         "=response=%s" % response])
 
+    @staticmethod
+    def challenge_response(password, challenge):
+        """
+        Prepare response for challenge-response login
+        (RouterOS <= 6.43rc17).
+        Args:
+            password - Password used to login
+            challenge - Hex encoded challenge as sent in the 'ret' attribute
+        Returns:
+            string - response to send as '=response=' attribute
+        """
+        # response is MD5 of 0-char + plaintext-password + challange
+        response = hashlib.md5()
+        response.update(b'\x00')
+        response.update(password.encode('UTF-8'))
+        response.update(binascii.unhexlify(challenge.encode('UTF-8')))
+        return "00" + binascii.hexlify(response.digest()).decode('UTF-8')
+
 
     def talk(self, words):
         """
@@ -136,39 +157,125 @@ class ApiRos:
             if len(sentence) == 0:
                 continue
 
-            # extract first word from sentence.
-            # this indicates the type of reply:
-            #  - !re
-            #    Replay
-            #  - !done
-            #    Acknowledgement
-            #  - !trap
-            #    API Error
-            #  - !fatal
-            #    Unrecoverable API Error
-            reply = sentence.pop(0)
-
-            attrs = {}
-            # extract attributes from the words replied by the API
-            for word in sentence:
-                # try to determine if there is a second equal sign in the
-                # word.
-                try:
-                    second_eq_pos = word.index('=', 1)
-                except IndexError:
-                    attrs[word[1:]] = ''
-                else:
-                    attrs[word[1:second_eq_pos]] = word[second_eq_pos + 1:]
-
-            replies.append((reply, attrs))
-            if reply == '!done':
+            replies.append(self.parse_sentence(sentence))
+            if replies[-1][0] == '!done':
                 if replies[0][0] == '!trap':
                     raise ApiError(replies[0][1])
                 if replies[0][0] == '!fatal':
-                    self.sock.close()
+                    self.close()
                     raise ApiUnrecoverableError(replies[0][1])
                 return replies
 
+    def talk_many(self, batch):
+        """
+        Communicate with the API, sending several commands at once.
+        All commands are tagged and written in one go, then replies are
+        read until every command has been acknowledged.
+        Args:
+            batch - List of lists of API words to send
+        Returns:
+            list - replies for each command, in the order of batch
+        """
+        self.write_many(batch)
+
+        replies = [[] for _ in batch]
+        pending = len(batch)
+        while pending:
+            sentence = self.read_sentence()
+
+            # empty sentences are ignored
+            if len(sentence) == 0:
+                continue
+
+            if self.add_tagged_reply(replies, sentence):
+                pending -= 1
+        return self.check_tagged_replies(replies)
+
+    def write_many(self, batch):
+        """
+        writes several sentences to API socket using a single write.
+        Each sentence is tagged with its index in batch.
+        Args:
+            batch - List of lists of API words to send
+        """
+        self.write_sock(''.join(
+            ''.join(self.encode_word(word) for word in words) +
+            self.encode_word('.tag=%d' % tag) + self.encode_word('')
+            for tag, words in enumerate(batch)))
+
+    def add_tagged_reply(self, replies, sentence):
+        """
+        Parse a reply sentence of a tagged command and add it to the replies
+        of the command. The tag attribute is removed from the reply.
+        Args:
+            replies - List of replies for each command
+            sentence - List of API words as read by read_sentence
+        Returns:
+            bool - True if the command has been acknowledged (!done)
+        """
+        reply, attrs = self.parse_sentence(sentence)
+        # '.tag=N' words are stored as 'tag' by parse_sentence
+        tag = attrs.pop('tag', None)
+        if tag is None:
+            if reply == '!fatal':
+                self.close()
+                raise ApiUnrecoverableError(attrs)
+            raise ApiUnrecoverableError("untagged reply received")
+        try:
+            replies[int(tag)].append((reply, attrs))
+        except (ValueError, IndexError) as exc:
+            raise ApiUnrecoverableError("unknown tag received") from exc
+        return reply == '!done'
+
+    @staticmethod
+    def check_tagged_replies(replies):
+        """
+        Raise an error if any of the tagged commands failed.
+        Args:
+            replies - List of replies for each command
+        Returns:
+            list - replies
+        """
+        for reply in replies:
+            if reply[0][0] == '!trap':
+                raise ApiError(reply[0][1])
+        return replies
+
+    @staticmethod
+    def parse_sentence(sentence):
+        """
+        Split a reply sentence into its type and attributes.
+        Args:
+            sentence - List of API words as read by read_sentence
+        Returns:
+            tuple - (reply type, dict of attributes)
+        """
+        # extract first word from sentence.
+        # this indicates the type of reply:
+        #  - !re
+        #    Replay
+        #  - !done
+        #    Acknowledgement
+        #  - !trap
+        #    API Error
+        #  - !fatal
+        #    Unrecoverable API Error
+        reply = sentence[0]
+
+        attrs = {}
+        # extract attributes from the words replied by the API
+        for word in sentence[1:]:
+            # try to determine if there is a second equal sign in the
+            # word.
+            try:
+                second_eq_pos = word.index('=', 1)
+            except IndexError:
+                attrs[word[1:]] = ''
+            else:
+                attrs[word[1:second_eq_pos]] = word[second_eq_pos + 1:]
+
+        return reply, attrs
+
     def write_sentence(self, words):
         """
         writes a sentence word by word to API socket.
@@ -205,43 +312,51 @@ class ApiRos:
         Args:
             word
         """
-
-        length = len(word)
         ## Disable the log attempt as it creates unneeded forced info
         ## to shown on the screen with no option to disable this.
         # LOG.debug("<<< %s", word)
-        
+        self.write_sock(self.encode_word(word))
+
+    @staticmethod
+    def encode_word(word):
+        """
+        encodes a word including its length as sent over the wire.
+        Args:
+            word
+        Returns:
+            string - encoded length followed by the word
+        """
+        length = len(word)
+
         # word length < 128
         if length < 0x80:
-            self.write_sock(chr(length))
+            return chr(length) + word
         # word length < 16384
         elif length < 0x4000:
             length |= 0x8000
-            self.write_sock(chr((length >> 8) & 0xFF))
-            self.write_sock(chr(length & 0xFF))
+            return (chr((length >> 8) & 0xFF) +
+                    chr(length & 0xFF) + word)
         # word length < 2097152
         elif length < 0x200000:
             length |= 0xC00000
-            self.write_sock(chr((length >> 16) & 0xFF))
-            self.write_sock(chr((length >> 8) & 0xFF))
-            self.write_sock(chr(length & 0xFF))
+            return (chr((length >> 16) & 0xFF) +
+                    chr((length >> 8) & 0xFF) +
+                    chr(length & 0xFF) + word)
         # word length < 268435456
         elif length < 0x10000000:
             length |= 0xE0000000
-            self.write_sock(chr((length >> 24) & 0xFF))
-            self.write_sock(chr((length >> 16) & 0xFF))
-            self.write_sock(chr((length >> 8) & 0xFF))
-            self.write_sock(chr(length & 0xFF))
+            return (chr((length >> 24) & 0xFF) +
+                    chr((length >> 16) & 0xFF) +
+                    chr((length >> 8) & 0xFF) +
+                    chr(length & 0xFF) + word)
         # word length < 549755813888
         elif length < 0x8000000000:
-            self.write_sock(chr(0xF0))
-            self.write_sock(chr((length >> 24) & 0xFF))
-            self.write_sock(chr((length >> 16) & 0xFF))
-            self.write_sock(chr((length >> 8) & 0xFF))
-            self.write_sock(chr(length & 0xFF))
-        else:
-            raise ApiUnrecoverableError("word-length exceeded")
-        self.write_sock(word)
+            return (chr(0xF0) +
+                    chr((length >> 24) & 0xFF) +
+                    chr((length >> 16) & 0xFF) +
+                    chr((length >> 8) & 0xFF) +
+                    chr(length & 0xFF) + word)
+        raise ApiUnrecoverableError("word-length exceeded")
 
     def read_word(self):
         """
@@ -257,68 +372,59 @@ class ApiRos:
 
         # we read the first char from the socket and determine its ASCII code.
         # (ASCII code is used to encode the length. Char "a" == 65 f.e.
-        length = ord(self.read_sock(1))
+        length, extra = self.decode_length(ord(self.read_sock(1)))
+
+        # read and shift the remaining bytes of the length, highest first
+        if extra:
+            for char in self.read_sock(extra):
+                length = (length << 8) + ord(char)
+
+        # read actual word from socket, using length determined above
+        ret = self.read_sock(length)
+        ## Disable the log attempt as it creates unneeded forced info
+        ## to shown on the screen with no option to disable this.
+        # LOG.debug(">>> %s", ret)
+        return ret
 
+    def close(self):
+        """
+        close API socket, used after unrecoverable errors.
+        """
+        if self.rfile is not None:
+            self.rfile.close()
+        self.sock.close()
+
+    @staticmethod
+    def decode_length(control):
+        """
+        decodes the first byte of an encoded word length.
+        Args:
+            control - Value of the first byte
+        Returns:
+            tuple - (length bits contained in the first byte,
+                     number of additional bytes to read)
+        """
         # if most significant bit is 0
         # -> length < 128, no additional bytes need to be read
-        if (length & 0x80) == 0x00:
-            pass
+        if (control & 0x80) == 0x00:
+            return control, 0
         # if the two most significant bits are 10
         # -> length is >= 128, but < 16384
-        elif (length & 0xC0) == 0x80:
-            # unmask and shift the second lowest byte
-            length &= ~0xC0
-            length <<= 8
-            # read the lowest byte
-            length += ord(self.read_sock(1))
+        elif (control & 0xC0) == 0x80:
+            return control & ~0xC0, 1
         # if the three most significant bits are 110
         # -> length is >= 16384, but < 2097152
-        elif (length & 0xE0) == 0xC0:
-            # unmask and shift the third lowest byte
-            length &= ~0xE0
-            length <<= 8
-            # read and shift second lowest byte
-            length += ord(self.read_sock(1))
-            length <<= 8
-            # read lowest byte
-            length += ord(self.read_sock(1))
+        elif (control & 0xE0) == 0xC0:
+            return control & ~0xE0, 2
         # if the four most significant bits are 1110
         # length is >= 2097152, but < 268435456
-        elif (length & 0xF0) == 0xE0:
-            # unmask and shift the fourth lowest byte
-            length &= ~0xF0
-            length <<= 8
-            # read and shift third lowest byte
-            length += ord(self.read_sock(1))
-            length <<= 8
-            # read and shift second lowest byte
-            length += ord(self.read_sock(1))
-            length <<= 8
-            # read lowest byte
-            length += ord(self.read_sock(1))
+        elif (control & 0xF0) == 0xE0:
+            return control & ~0xF0, 3
         # if the five most significant bits are 11110
         # length is >= 268435456, but < 4294967296
-        elif (length & 0xF8) == 0xF0:
-            # read and shift fourth lowest byte
-            length = ord(self.read_sock(1))
-            length <<= 8
-            # read and shift third lowest byte
-            length += ord(self.read_sock(1))
-            length <<= 8
-            # read and shift second lowest byte
-            length += ord(self.read_sock(1))
-            length <<= 8
-            # read lowest byte
-            length += ord(self.read_sock(1))
-        else:
-            raise ApiUnrecoverableError("unknown control byte received")
-
-        # read actual word from socket, using length determined above
-        ret = self.read_sock(length)
-        ## Disable the log attempt as it creates unneeded forced info
-        ## to shown on the screen with no option to disable this.
-        # LOG.debug(">>> %s", ret)
-        return ret
+        elif (control & 0xF8) == 0xF0:
+            return 0, 4
+        raise ApiUnrecoverableError("unknown control byte received")
 
     def write_sock(self, string):
         """
@@ -334,16 +440,49 @@ class ApiRos:
     def read_sock(self, length):
         """
         read string with specified length from API socket
+        Reads from the buffered reader if one is set. Otherwise data is
+        received into a buffer reused between calls, and only decoded to
+        the returned string.
         Args:
             length - Number of chars to read from socket
         Returns:
             string - String as read from socket
         """
-        string = ''
-        while len(string) < length:
-            # read data from socket with a maximum buffer size of 4k
-            chunk = self.sock.recv(min(length - len(string), 4096))
-            if not chunk:
+        if self.rfile is not None:
+            data = self.rfile.read(length)
+            if len(data) < length:
+                raise ApiUnrecoverableError("could not read from socket")
+            return data.decode('latin-1', 'replace')
+
+        if length > self.RX_BUFFER_SIZE:
+            # words larger than the receive buffer get their own buffer
+            view = memoryview(bytearray(length))
+        else:
+            if self._rxview is None:
+                self._rxview = memoryview(bytearray(self.RX_BUFFER_SIZE))
+            view = self._rxview[:length]
+
+        received = 0
+        while received < length:
+            count = self.sock.recv_into(view[received:])
+            if not count:
                 raise ApiUnrecoverableError("could not read from socket")
-            string = string + chunk.decode('latin-1', 'replace')
-        return string
\ No newline at end of file
+            received += count
+        return str(view, 'latin-1', 'replace')
+
+
+## Pure python implementations of the helpers which have a compiled
+## version, kept to compare both in tests.
+PYTHON_HELPERS = {
+    name: ApiRos.__dict__[name]
+    for name in ('encode_word', 'decode_length', 'parse_sentence')}
+
+## Use the compiled word encoding/decoding helpers if they have been built
+## (f.e. when Cython was available during installation).
+try:
+    from tikapy import _fast
+except ImportError:
+    _fast = None
+else:
+    for _name in PYTHON_HELPERS:
+        setattr(ApiRos, _name, staticmethod(getattr(_fast, _name)))
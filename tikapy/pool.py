@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+
+#
+# Copyright (c) 2015, VSHN AG, info@vshn.ch
+# Licensed under "BSD 3-Clause". See LICENSE file.
+#
+# Authors:
+#  - Andre Keller <andre.keller@vshn.ch>
+#
+
+"""
+Pool of logged in RouterOS API clients, shared between threads.
+
+    pool = TikapyPool(max_per_host=4)
+    with pool.connection('10.140.66.11', 'api-test', 'api123',
+                         tls=True) as client:
+        client.talk(['/interface/print'])
+"""
+
+import collections
+import contextlib
+import hashlib
+import threading
+import time
+
+from . import ClientError, TikapyClient, TikapySslClient
+
+
+class TikapyPool:
+    """
+    Keeps logged in clients per (host, port, tls, user, password, client
+    arguments) for reuse.
+    Only a digest of the password is kept as part of the key.
+    """
+
+    ## Command sent to check whether an idle connection is still alive.
+    PING = ['/system/identity/print']
+
+    def __init__(self, max_per_host=4, ttl=300, timeOut=60):
+        """
+        Initialize pool.
+        :param max_per_host: Maximum number of open connections per
+                             (host, port, tls, user, password, client
+                             arguments)
+        :param ttl: Number of seconds a connection may stay idle in the pool
+        :param timeOut: Timeout used when opening new connections
+        """
+        self.max_per_host = max_per_host
+        self.ttl = ttl
+        self.timeOut = timeOut
+        self._idle = {}
+        self._open = collections.Counter()
+        self._in_use = {}
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _create(host, port, tls, client_kwargs):
+        """
+        Create a new (not yet logged in) client.
+        """
+        if tls:
+            return TikapySslClient(host, port, **client_kwargs)
+        return TikapyClient(host, port, **client_kwargs)
+
+    def _pop_idle(self, key):
+        """
+        Returns the most recently released idle client for key, or None.
+        Clients idle for longer than ttl are closed.
+        Must be called with self._cond held.
+        """
+        idle = self._idle.get(key)
+        now = time.monotonic()
+        while idle:
+            client, released = idle.pop()
+            if now - released <= self.ttl:
+                return client
+            client.disconnect()
+            self._open[key] -= 1
+        return None
+
+    def acquire(self, host, user, password, port=None, tls=False,
+                timeout=None, **client_kwargs):
+        """
+        Returns a logged in client, reusing an idle one if possible.
+        Idle clients are checked by sending PING before being returned.
+        Waits for a connection to be released if max_per_host connections
+        are open already.
+        :param host: Remote device address (maybe a hostname)
+        :param user: Username for API connections
+        :param password: Password for API connections
+        :param port: Remote device port (defaults to 8728, 8729 for TLS)
+        :param tls: Use a SSL API client
+        :param timeout: Seconds to wait for a free connection,
+                        None waits forever
+        :param client_kwargs: Further arguments of the client, f.e.
+                              verify_cert or keepalive. Only clients created
+                              with the same arguments are reused.
+        :raises: ClientError - if no connection could be established
+                             - on timeout
+        """
+        if port is None:
+            port = 8729 if tls else 8728
+        key = (host, port, tls, user,
+               hashlib.sha256(password.encode('UTF-8')).digest(),
+               tuple(sorted(client_kwargs.items())))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                client = self._pop_idle(key)
+                while client is None and self._open[key] >= self.max_per_host:
+                    remaining = (None if deadline is None
+                                 else deadline - time.monotonic())
+                    if remaining is not None and remaining <= 0:
+                        raise ClientError('no connection available')
+                    self._cond.wait(remaining)
+                    client = self._pop_idle(key)
+                if client is None:
+                    self._open[key] += 1
+
+            if client is not None:
+                try:
+                    client.talk(self.PING)
+                except (ClientError, OSError):
+                    self._drop(key, client)
+                    continue
+            else:
+                try:
+                    client = self._create(host, port, tls, client_kwargs)
+                    client.login(user, password, self.timeOut)
+                except Exception:
+                    self._drop(key, client)
+                    raise
+
+            with self._cond:
+                self._in_use[client] = key
+            return client
+
+    def release(self, client):
+        """
+        Return a client to the pool.
+        Clients whose connection failed are closed instead.
+        :param client: Client as returned by acquire()
+        """
+        with self._cond:
+            key = self._in_use.pop(client)
+            if client.connected:
+                self._idle.setdefault(key, collections.deque()).append(
+                    (client, time.monotonic()))
+                self._cond.notify_all()
+                return
+        self._drop(key, client)
+
+    def _drop(self, key, client):
+        """
+        Close a client and free its slot.
+        """
+        if client is not None:
+            client.disconnect()
+        with self._cond:
+            self._open[key] -= 1
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def connection(self, host, user, password, port=None, tls=False,
+                   timeout=None, **client_kwargs):
+        """
+        Context manager acquiring a client and releasing it afterwards.
+        See acquire() for parameters.
+        """
+        client = self.acquire(host, user, password, port, tls, timeout,
+                              **client_kwargs)
+        try:
+            yield client
+        except OSError:
+            # socket errors leave the connection in an unknown state
+            client.disconnect()
+            raise
+        finally:
+            self.release(client)
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        with self._cond:
+            for key, idle in self._idle.items():
+                while idle:
+                    idle.pop()[0].disconnect()
+                    self._open[key] -= 1
+            self._idle.clear()